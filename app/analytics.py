@@ -1,6 +1,27 @@
 # app/analytics.py
 
+import os
+import sys
+import warnings
+
+import numpy as np
 import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+def get_backend(name: str = None):
+    """
+    Return the module implementing monthly_totals / compute_company_summary:
+    'pandas' (this module, default) or 'duckdb' (analytics_sql).
+    Defaults to the ANALYTICS_BACKEND environment variable.
+    """
+    name = (name or os.environ.get('ANALYTICS_BACKEND', 'pandas')).lower()
+    if name == 'duckdb':
+        import analytics_sql
+        return analytics_sql
+    if name != 'pandas':
+        raise ValueError(f"Unknown analytics backend: {name!r}")
+    return sys.modules[__name__]
 
 
 def monthly_totals(
@@ -21,6 +42,52 @@ def monthly_totals(
         .rename(columns={amount_col: 'MonthlySum'})
     )
 
+
+# --- Mergeable partial aggregates --------------------------------------------
+# Each chunk of line items (a sheet, a file, a block of rows) is reduced to
+# per-company/program/month sums and row counts. Sums and counts simply add
+# up, so chunks can be processed independently (also in parallel) and merged
+# without ever holding all line items at once.
+
+PARTIAL_KEYS = ['Y-tunnus', 'Yrityksen nimi', 'Ohjelmisto', 'Kuukausi']
+
+
+def partial_totals(
+    df: pd.DataFrame,
+    amount_col: str = 'Summa'
+) -> pd.DataFrame:
+    """
+    Partial aggregate of one chunk of cleaned line items.
+    Returns columns: Y-tunnus, Yrityksen nimi, Ohjelmisto, Kuukausi, Sum, Rows.
+    """
+    return (
+        df
+        .groupby(PARTIAL_KEYS, as_index=False)
+        .agg(Sum=(amount_col, 'sum'), Rows=(amount_col, 'size'))
+    )
+
+
+def merge_partials(partials) -> pd.DataFrame:
+    """Merge partial aggregates (from partial_totals or earlier merges) into one."""
+    partials = list(partials)
+    if not partials:
+        return pd.DataFrame(columns=PARTIAL_KEYS + ['Sum', 'Rows'])
+    return (
+        pd.concat(partials, ignore_index=True)
+        .groupby(PARTIAL_KEYS, as_index=False)[['Sum', 'Rows']]
+        .sum()
+    )
+
+
+def totals_from_partials(partial: pd.DataFrame) -> pd.DataFrame:
+    """Turn a (merged) partial aggregate into monthly_totals output."""
+    return (
+        partial
+        .drop(columns=['Rows'])
+        .rename(columns={'Sum': 'MonthlySum'})
+    )
+
+
 def compute_company_summary(df: pd.DataFrame) -> pd.DataFrame:
     """
      Summarize monthly sums for one program/company:
@@ -28,7 +95,14 @@ def compute_company_summary(df: pd.DataFrame) -> pd.DataFrame:
       - Mean, std, CV over last 3 months
       - Mean, std, CV over last 12 months
     """
-    mt = monthly_totals(df)
+    return summarize_monthly(monthly_totals(df))
+
+
+def summarize_monthly(mt: pd.DataFrame) -> pd.DataFrame:
+    """
+    compute_company_summary starting from monthly_totals output, e.g. totals
+    merged from partial aggregates, so line items are not needed again.
+    """
 
     def summarize(group: pd.DataFrame) -> pd.Series:
         # Sort by month
@@ -85,3 +159,160 @@ def compute_company_summary(df: pd.DataFrame) -> pd.DataFrame:
     # Drop the extra 'Ohjelmisto' index column since it's now in 'Program'
     summary = summary.drop(columns=['Ohjelmisto'], errors='ignore')
     return summary
+
+
+# --- Cost-change alerts ------------------------------------------------------
+
+ALERT_COLS = [
+    'Y-tunnus', 'Yrityksen nimi', 'Kuukausi', 'MonthlySum', 'PrevMonth',
+    'Change', 'ChangePct', 'ZScore', 'Direction',
+]
+PRODUCT_COLS = ['NewProducts', 'RemovedProducts']
+
+
+def _product_changes(df: pd.DataFrame, months) -> pd.DataFrame:
+    """
+    New / removed products per company and month compared with the previous
+    month. Returns Y-tunnus, Kuukausi, NewProducts, RemovedProducts.
+    """
+    items = (
+        df.loc[df['Kuukausi'].isin(months), ['Y-tunnus', 'Kuukausi', 'Tuote']]
+        .dropna()
+        # product names may be read as numbers; mixed types break sort / join
+        .astype({'Tuote': str})
+        .drop_duplicates()
+    )
+    # the same products shifted one month forward = "what was there before"
+    before = items.assign(Kuukausi=items['Kuukausi'] + pd.offsets.MonthBegin(1))
+    both = items.merge(before, how='outer', indicator=True)
+    # only months the company actually has rows in (not the month after it ended)
+    both = both[both['Kuukausi'].isin(months)]
+
+    def listed(side):
+        return (
+            both[both['_merge'] == side]
+            .sort_values('Tuote')
+            .groupby(['Y-tunnus', 'Kuukausi'])['Tuote']
+            .agg(', '.join)
+        )
+
+    return pd.concat(
+        {'NewProducts': listed('left_only'), 'RemovedProducts': listed('right_only')},
+        axis=1
+    ).reset_index()
+
+
+def cost_change_alerts(
+    monthly_tbl: pd.DataFrame,
+    df: pd.DataFrame = None,
+    month=None,
+    window: int = 12,
+    min_history: int = 6,
+    z_thresh: float = 5.0,
+    pct_thresh: float = 0.5,
+    min_change: float = 10.0,
+) -> pd.DataFrame:
+    """
+    Flag companies whose monthly software cost jumped or dropped.
+
+    Works on the company × month matrix of `monthly_tbl` (programs summed) in
+    one vectorized pass: month-over-month change, change-% and a z-score
+    against the company's own previous `window` months (at least
+    `min_history` months). Months inside a company's active range without
+    rows count as 0 €. A month alerts when the change is at least
+    `min_change` € and either |z| >= z_thresh or the month differs from the
+    company's usual level by >= pct_thresh (history mean; the previous
+    month while there is less than `min_history` months of history).
+
+    The z-score uses the sample std scaled to a prediction interval,
+    (x - mean) / (std * sqrt(1 + 1/n)): with only 6-12 months of history
+    a population-std z >= 3 flags ~5 % of plain noise, and so does a
+    change-% against a single, possibly low, previous month. With the
+    defaults stationary noise alerts in ~0.05 % of company-months.
+
+    With line items `df`, new and removed products (column 'Tuote') versus
+    the previous month are listed too. `month` limits the result to one
+    month. Rows are ranked by |z| (missing last), then by |change|.
+    """
+    columns = ALERT_COLS + (PRODUCT_COLS if df is not None else [])
+    if monthly_tbl.empty:
+        return pd.DataFrame(columns=columns)
+
+    mat = monthly_tbl.pivot_table(
+        index=['Y-tunnus', 'Yrityksen nimi'],
+        columns='Kuukausi',
+        values='MonthlySum',
+        aggfunc='sum',
+    )
+    if mat.empty:   # no months with a sum at all
+        return pd.DataFrame(columns=columns)
+    months = pd.date_range(mat.columns.min(), mat.columns.max(), freq='MS')
+    mat = mat.reindex(columns=months)
+    v = mat.to_numpy(dtype=float)
+
+    # gaps between a company's first and last month are 0 €, outside stay NaN
+    observed = ~np.isnan(v)
+    col = np.arange(v.shape[1])
+    first = observed.argmax(axis=1)
+    last = v.shape[1] - 1 - observed[:, ::-1].argmax(axis=1)
+    active = (col >= first[:, None]) & (col <= last[:, None])
+    v = np.where(active & ~observed, 0.0, v)
+
+    prev = np.full_like(v, np.nan)
+    prev[:, 1:] = v[:, :-1]
+    change = v - prev
+    with np.errstate(divide='ignore', invalid='ignore'):
+        pct = np.where(prev != 0, change / np.abs(prev), np.nan)
+
+    # history = the previous `window` months (not the month itself):
+    # pad on the left and view each month's window without copying
+    padded = np.concatenate([np.full((v.shape[0], window), np.nan), v], axis=1)
+    hist = sliding_window_view(padded, window, axis=1)[:, :v.shape[1]]
+    n = (~np.isnan(hist)).sum(axis=2)
+    enough = n >= max(min_history, 2)
+    with warnings.catch_warnings(), np.errstate(divide='ignore', invalid='ignore'):
+        warnings.simplefilter('ignore', RuntimeWarning)   # all-NaN windows
+        mu = np.nanmean(hist, axis=2)
+        sd = np.nanstd(hist, axis=2, ddof=1) * np.sqrt(1 + 1 / n)
+        z = np.where(enough & (sd > 0), (v - mu) / sd, np.nan)
+        base = np.where(enough, mu, prev)
+        level_pct = np.where(base != 0, (v - base) / np.abs(base), np.nan)
+
+    hit = (
+        ~np.isnan(change)
+        & (np.abs(change) >= min_change)
+        & ((np.abs(z) >= z_thresh) | (np.abs(level_pct) >= pct_thresh))
+    )
+    if month is not None:
+        hit &= (months == pd.Timestamp(month))[None, :]
+
+    r, c = np.nonzero(hit)
+    alerts = pd.DataFrame({
+        'Y-tunnus': mat.index.get_level_values('Y-tunnus')[r],
+        'Yrityksen nimi': mat.index.get_level_values('Yrityksen nimi')[r],
+        'Kuukausi': months[c],
+        'MonthlySum': v[r, c],
+        'PrevMonth': prev[r, c],
+        'Change': change[r, c],
+        'ChangePct': pct[r, c],
+        'ZScore': z[r, c],
+    })
+    alerts['Direction'] = np.where(alerts['Change'] > 0, 'Up', 'Down')
+
+    if df is not None and alerts.empty:
+        alerts = alerts.reindex(columns=columns)
+    elif df is not None:
+        alert_months = pd.DatetimeIndex(alerts['Kuukausi'].unique())
+        needed = alert_months.union(alert_months - pd.offsets.MonthBegin(1))
+        products = _product_changes(df, needed)
+        alerts = alerts.merge(products, on=['Y-tunnus', 'Kuukausi'], how='left')
+        alerts[PRODUCT_COLS] = alerts[PRODUCT_COLS].fillna('')
+
+    alerts = (
+        alerts
+        .assign(_absz=alerts['ZScore'].abs(), _absc=alerts['Change'].abs())
+        .sort_values(['_absz', '_absc'], ascending=False, na_position='last')
+        .drop(columns=['_absz', '_absc'])
+        .reset_index(drop=True)
+    )
+    return alerts
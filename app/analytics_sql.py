@@ -0,0 +1,164 @@
+# app/analytics_sql.py
+#
+# DuckDB implementation of the analytics functions. Same signatures and
+# output as analytics.py, but the aggregation and the 1/3/6/12-month window
+# statistics run as SQL over a DataFrame, an Arrow table or Parquet file(s).
+# duckdb is optional: it is only imported when one of these is called.
+
+import os
+
+import pandas as pd
+
+KEYS = ['Y-tunnus', 'Yrityksen nimi', 'Ohjelmisto']
+
+
+def _connect():
+    try:
+        import duckdb
+    except ImportError as ex:
+        raise ImportError(
+            "DuckDB-taustaa varten tarvitaan duckdb-paketti: pip install duckdb"
+        ) from ex
+    return duckdb.connect()
+
+
+def _q(name: str) -> str:
+    """Quote an identifier ('Y-tunnus' → \"Y-tunnus\")."""
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _source(con, data, columns) -> str:
+    """
+    Make `data` queryable and return the FROM clause for it.
+    `data` is a DataFrame, a pyarrow Table or a Parquet path/glob.
+    """
+    if isinstance(data, (str, os.PathLike)):
+        path = os.fspath(data).replace("'", "''")
+        return f"read_parquet('{path}')"
+    if isinstance(data, pd.DataFrame):
+        data = data[columns]
+    con.register("lines", data)
+    return "lines"
+
+
+def _monthly_sql(src: str, amount_col: str) -> str:
+    keys = ", ".join(_q(c) for c in KEYS + ['Kuukausi'])
+    not_null = " AND ".join(f"{_q(c)} IS NOT NULL" for c in KEYS + ['Kuukausi'])
+    return f"""
+        SELECT {keys},
+               COALESCE(SUM({_q(amount_col)}), 0) AS "MonthlySum"
+        FROM {src}
+        WHERE {not_null}
+        GROUP BY {keys}
+    """
+
+
+def _as_frame(con, sql: str) -> pd.DataFrame:
+    out = con.execute(sql).df()
+    if 'Kuukausi' in out.columns:
+        out['Kuukausi'] = out['Kuukausi'].astype('datetime64[ns]')
+    return out
+
+
+def monthly_totals(
+    df: pd.DataFrame,
+    amount_col: str = 'Summa'
+) -> pd.DataFrame:
+    """
+    Group cleaned data by company, program, and month, summing up `amount_col`.
+    Returns columns: Y-tunnus, Yrityksen nimi, Ohjelmisto, Kuukausi, MonthlySum.
+    """
+    con = _connect()
+    try:
+        src = _source(con, df, KEYS + ['Kuukausi', amount_col])
+        sql = _monthly_sql(src, amount_col) + " ORDER BY 1, 2, 3, 4"
+        return _as_frame(con, sql)
+    finally:
+        con.close()
+
+
+def _summary_sql(mt_sql: str) -> str:
+    """
+    Same statistics as analytics.summarize_monthly, as SQL window functions:
+    months are ranked newest-first per company/program so the 1/3/6/12-month
+    figures are filtered aggregates over that rank, and the seasonality trend
+    is a centred 12-row moving average (min. 6 rows).
+    """
+    part = ", ".join(_q(c) for c in KEYS)
+    # pandas centred rolling(12) covers rows i-6 … i+5
+    win = (f"PARTITION BY {part} ORDER BY \"Kuukausi\" "
+           "ROWS BETWEEN 6 PRECEDING AND 5 FOLLOWING")
+
+    def last(fn, n):
+        return f'{fn}("MonthlySum") FILTER (WHERE rn <= {n})'
+
+    def nz(expr):
+        # Python's `x or 1`
+        return f"CASE WHEN {expr} = 0 THEN 1 ELSE {expr} END"
+
+    return f"""
+            WITH mt AS ({mt_sql}),
+            w AS (
+                SELECT *,
+                       ROW_NUMBER() OVER (PARTITION BY {part}
+                                          ORDER BY "Kuukausi" DESC) AS rn,
+                       CASE WHEN COUNT("MonthlySum") OVER ({win}) >= 6
+                            THEN AVG("MonthlySum") OVER ({win}) END AS rolling_mean
+                FROM mt
+            ),
+            agg AS (
+                SELECT {part},
+                       MIN("Kuukausi")            AS start_month,
+                       MAX("Kuukausi")            AS end_month,
+                       AVG("MonthlySum")          AS "AvgAll",
+                       {last('AVG', 1)}           AS "LastMonth",
+                       {last('AVG', 3)}           AS "Avg3Mo",
+                       {last('AVG', 6)}           AS "Avg6Mo",
+                       {last('AVG', 12)}          AS "Avg12Mo",
+                       {last('STDDEV_POP', 3)}    AS "Std3Mo",
+                       {last('STDDEV_POP', 6)}    AS "Std6Mo",
+                       {last('STDDEV_POP', 12)}   AS "Std12Mo",
+                       MAX("MonthlySum" - rolling_mean)
+                         - MIN("MonthlySum" - rolling_mean) AS seasonal_amp,
+                       AVG(rolling_mean)          AS trend_mean
+                FROM w
+                GROUP BY {part}
+            )
+            SELECT "Y-tunnus", "Yrityksen nimi",
+                   "Ohjelmisto" AS "Program",
+                   strftime(start_month, '%b-%y') || ' to '
+                     || strftime(end_month, '%b-%y') AS "DateRange",
+                   "AvgAll", "LastMonth", "Avg3Mo", "Avg6Mo", "Avg12Mo",
+                   "Std3Mo", "Std6Mo", "Std12Mo",
+                   "Std3Mo" / {nz('"Avg3Mo"')}   AS "CV3Mo",
+                   "Std6Mo" / {nz('"Avg6Mo"')}   AS "CV6Mo",
+                   "Std12Mo" / {nz('"Avg12Mo"')} AS "CV12Mo",
+                   "Avg3Mo" / {nz('"Avg12Mo"')}  AS "GrowthRatio",
+                   seasonal_amp / {nz('COALESCE(trend_mean, "AvgAll")')} AS "Seasonality"
+            FROM agg
+            ORDER BY "Y-tunnus", "Yrityksen nimi", "Ohjelmisto"
+        """
+
+
+def compute_company_summary(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Summarize monthly sums for one program/company, like
+    analytics.compute_company_summary.
+    """
+    con = _connect()
+    try:
+        src = _source(con, df, KEYS + ['Kuukausi', 'Summa'])
+        return _as_frame(con, _summary_sql(_monthly_sql(src, 'Summa')))
+    finally:
+        con.close()
+
+
+def summarize_monthly(mt: pd.DataFrame) -> pd.DataFrame:
+    """compute_company_summary starting from monthly_totals output."""
+    con = _connect()
+    try:
+        src = _source(con, mt, KEYS + ['Kuukausi', 'MonthlySum'])
+        return _as_frame(con, _summary_sql(f"SELECT * FROM {src}"))
+    finally:
+        con.close()
+
@@ -0,0 +1,260 @@
+# app/api.py
+#
+# Small standalone HTTP service for fixed-price suggestions per Y-tunnus.
+# Loads one processed workbook (same layout as the Streamlit upload) once,
+# keeps the company summary and threshold flags in memory and reloads when
+# the file on disk is replaced.
+#
+#   python app/api.py data/netvisor_procountor_2024_2025.xlsx --port 8502
+#
+#   GET  /health
+#   GET  /price/<Y-tunnus>?margin=15&stat=Avg3Mo&stat=Avg12Mo&program=Netvisor
+#   POST /prices   {"ids": ["1234567-8", …], "margin": 15,
+#                   "stats": ["Avg3Mo"], "program": "Netvisor"}
+
+import argparse
+import json
+import math
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+from analytics import get_backend
+from pipeline import active_only, prepare_lines, read_sheets
+from pricing import add_flags
+from utils import normalize_business_id
+
+# Same choices as the pricing form in main.py
+STAT_OPTIONS = [
+    'AvgAll',
+    'LastMonth',
+    'Avg3Mo', 'Std3Mo', 'CV3Mo',
+    'Avg6Mo', 'Std6Mo', 'CV6Mo',
+    'Avg12Mo', 'Std12Mo', 'CV12Mo',
+]
+DEFAULT_STATS = ['LastMonth', 'Avg3Mo', 'Avg6Mo', 'Avg12Mo']
+DEFAULT_MARGIN = 15
+FLAG_COLS = ['High Volatility', 'Strong Growth', 'StrongDecline', 'High Seasonality']
+
+
+def _num(value):
+    """JSON-safe float (NaN → null)."""
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    return float(value)
+
+
+class PriceBook:
+    """
+    Immutable snapshot of one dataset: summary + default flags per company,
+    indexed by normalized Y-tunnus. Reloading builds a new PriceBook and
+    swaps the reference, so requests never see a half-loaded dataset.
+    """
+
+    def __init__(self, flags_df, source: str, mtime: float):
+        # same rule as the UI: drop credit-note "customers" (negative average)
+        flags_df = flags_df[flags_df['AvgAll'] >= 0]
+        self.source = source
+        self.mtime = mtime
+        self.loaded_at = time.time()
+        self.programs = sorted(flags_df['Program'].unique().tolist())
+        self.by_id = {}
+        for rec in flags_df.to_dict('records'):
+            key = normalize_business_id(rec['Y-tunnus'])
+            if key:   # rows without a usable Y-tunnus can't be looked up
+                self.by_id.setdefault(key, []).append(rec)
+
+    @classmethod
+    def load(cls, path: str, use_vat: bool = False, show_ended: bool = False) -> "PriceBook":
+        """Read → clean → summarize → flag; only what the API serves."""
+        mtime = os.path.getmtime(path)
+        df_clean = prepare_lines(read_sheets(path), use_vat)
+        if not show_ended:
+            df_clean = active_only(df_clean)
+        backend = get_backend()
+        summary_df = backend.summarize_monthly(backend.monthly_totals(df_clean))
+        return cls(add_flags(summary_df), path, mtime)
+
+    def quote(self, company_id, margin: float, stats, program: str = None) -> list:
+        """Price suggestions for one company (one entry per program)."""
+        if not isinstance(company_id, (str, int)):
+            return []
+        key = normalize_business_id(company_id)
+        if not key:   # 'abc', '' etc. are not Y-tunnus
+            return []
+        return [
+            _price_record(rec, margin, stats)
+            for rec in self.by_id.get(key, [])
+            if program is None or rec['Program'] == program
+        ]
+
+
+def _price_record(rec: dict, margin: float, stats) -> dict:
+    # column naming as in pricing.apply_margin
+    return {
+        'Y-tunnus': rec['Y-tunnus'],
+        'Yrityksen nimi': rec['Yrityksen nimi'],
+        'Program': rec['Program'],
+        'DateRange': rec['DateRange'],
+        'stats': {s: _num(rec[s]) for s in stats},
+        'prices': {
+            f"{s}_With{margin:.0f}Pct": _num(rec[s] * (1 + margin / 100.0))
+            for s in stats
+        },
+        'flags': {f: bool(rec[f]) for f in FLAG_COLS},
+    }
+
+
+def _parse_params(margin, stats, program) -> tuple:
+    """Validate query/body parameters; raises ValueError with a user-facing message."""
+    margin = float(DEFAULT_MARGIN if margin is None else margin)
+    # whole percents only, like the slider in the UI (and the _With{n}Pct key)
+    if not margin.is_integer() or not 0 <= margin <= 1000:
+        raise ValueError(f"Marginaalin pitää olla kokonaisluku 0–1000: {margin:g}")
+    margin = int(margin)
+    if not stats:
+        stats = DEFAULT_STATS
+    elif not isinstance(stats, list) or not all(isinstance(s, str) for s in stats):
+        raise ValueError("Tilastojen pitää olla lista nimiä, esim. [\"Avg3Mo\"]")
+    unknown = [s for s in stats if s not in STAT_OPTIONS]
+    if unknown:
+        raise ValueError(f"Tuntematon tilasto: {', '.join(unknown)}")
+    return margin, stats, program or None
+
+
+class PricingService:
+    """Holds the current PriceBook and reloads it when the file changes."""
+
+    def __init__(self, path: str, use_vat: bool = False, show_ended: bool = False):
+        self.path = path
+        self.use_vat = use_vat
+        self.show_ended = show_ended
+        self.book = PriceBook.load(path, use_vat, show_ended)
+
+    def reload_if_changed(self) -> bool:
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return False  # file being replaced; try again on the next tick
+        if mtime == self.book.mtime:
+            return False
+        self.book = PriceBook.load(self.path, self.use_vat, self.show_ended)
+        return True
+
+    def watch(self, interval: float) -> threading.Thread:
+        def loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    if self.reload_if_changed():
+                        print(f"Aineisto ladattu uudelleen: {self.path}")
+                except Exception as ex:
+                    # keep serving the previous dataset
+                    print(f"Uudelleenlataus epäonnistui: {ex}")
+
+        thread = threading.Thread(target=loop, name="dataset-watcher", daemon=True)
+        thread.start()
+        return thread
+
+
+class PricingHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"   # keep-alive for low per-request latency
+    quiet = True
+
+    @property
+    def book(self) -> PriceBook:
+        return self.server.service.book
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        book = self.book
+        if url.path == '/health':
+            return self._send(200, {
+                'status': 'ok',
+                'dataset': book.source,
+                'loaded_at': book.loaded_at,
+                'companies': len(book.by_id),
+                'programs': book.programs,
+            })
+        if url.path.startswith('/price/'):
+            company_id = unquote(url.path[len('/price/'):])
+            try:
+                margin, stats, program = _parse_params(
+                    query.get('margin', [None])[0],
+                    query.get('stat'),
+                    query.get('program', [None])[0],
+                )
+            except ValueError as ex:
+                return self._send(400, {'error': str(ex)})
+            results = book.quote(company_id, margin, stats, program)
+            if not results:
+                return self._send(404, {'error': f"Yritystä ei löytynyt: {company_id}"})
+            return self._send(200, {'results': results})
+        return self._send(404, {'error': 'Tuntematon polku'})
+
+    def do_POST(self):
+        if urlparse(self.path).path != '/prices':
+            return self._send(404, {'error': 'Tuntematon polku'})
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            body = json.loads(self.rfile.read(length) or b'{}')
+            ids = body.get('ids') or []
+            if not isinstance(ids, list):
+                raise ValueError("'ids' pitää olla lista")
+            margin, stats, program = _parse_params(
+                body.get('margin'), body.get('stats'), body.get('program')
+            )
+        except (ValueError, TypeError, AttributeError) as ex:
+            return self._send(400, {'error': str(ex)})
+
+        book = self.book   # one snapshot for the whole batch
+        results, missing = [], []
+        for company_id in ids:
+            found = book.quote(company_id, margin, stats, program)
+            if found:
+                results.extend(found)
+            else:
+                missing.append(company_id)
+        return self._send(200, {'results': results, 'missing': missing})
+
+    def _send(self, status: int, payload: dict):
+        data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        if not self.quiet:
+            super().log_message(format, *args)
+
+
+def make_server(service: PricingService, host: str, port: int) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer((host, port), PricingHandler)
+    server.daemon_threads = True
+    server.service = service
+    return server
+
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser(description="Kiinteähintaehdotukset HTTP-rajapintana")
+    ap.add_argument('dataset', help="Excel-tiedosto (sama muoto kuin sovellukseen ladattava)")
+    ap.add_argument('--host', default='127.0.0.1')
+    ap.add_argument('--port', type=int, default=8502)
+    ap.add_argument('--vat', action='store_true', help="käytä Summa-saraketta (sis. ALV)")
+    ap.add_argument('--show-ended', action='store_true', help="mukaan myös päättyneet asiakkuudet")
+    ap.add_argument('--reload-interval', type=float, default=10.0,
+                    help="kuinka usein (s) tiedoston muutos tarkistetaan")
+    ap.add_argument('--verbose', action='store_true', help="lokita jokainen pyyntö")
+    args = ap.parse_args()
+
+    PricingHandler.quiet = not args.verbose
+    service = PricingService(args.dataset, use_vat=args.vat, show_ended=args.show_ended)
+    service.watch(args.reload_interval)
+    server = make_server(service, args.host, args.port)
+    print(f"{len(service.book.by_id)} yritystä ladattu, kuunnellaan http://{args.host}:{args.port}")
+    server.serve_forever()
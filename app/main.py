@@ -1,44 +1,115 @@
 # app/main.py
 
 import streamlit as st
-import pandas as pd
-import io
+import base64
+import time
+from functools import partial
 from io import BytesIO
-from parser import load_data, clean_dataframe
-from analytics import compute_company_summary
-from analytics import monthly_totals
-from st_aggrid import AgGrid, GridOptionsBuilder, GridUpdateMode, JsCode
-from pricing import add_fixed_price_suggestions
-from PIL import Image
-import hashlib
-from utils import normalize_business_id, normalize_name, find_col
-
-logo = Image.open('app/Taopa logo.png')
-
-# --- Read + clean + summarise only once per file ----------------------------
-@st.cache_data(show_spinner="📂 Luetaan Excel-tiedostoa …")
-def prep_everything(file_bytes: bytes, use_vat: bool):
+
+# Raskaat kirjastot (pandas, analytiikka, st_aggrid, openpyxl) tuodaan vasta
+# niissä haaroissa, jotka niitä tarvitsevat, jotta latauskenttä näkyy heti.
+# Tarkistus: python benchmarks/importtime_budget.py
+
+
+@st.cache_resource
+def _logo_data_uri() -> str:
     """
-    Returns: df_clean, summary_df, monthly_tbl
+    Read the logo from disk once per process. Rendered as a data URI
+    because st.image imports numpy and PIL.
     """
-    df_np = load_data(BytesIO(file_bytes),
-                      sheet_name="Netvisor + Procountor 2024-2025")
-    df_fn = load_data(BytesIO(file_bytes),
-                      sheet_name="Fennoa 2024-2025")
-    df_raw   = pd.concat([df_np, df_fn], ignore_index=True)
-    df_clean = clean_dataframe(df_raw)
+    with open('app/Taopa logo.png', 'rb') as f:
+        return "data:image/png;base64," + base64.b64encode(f.read()).decode("ascii")
 
-    # ----- DROP rows where company name starts with ":" ---------------
-    df_clean = df_clean[
-        ~df_clean["Yrityksen nimi"].str.startswith(":", na=False)
-    ]
 
-    if not use_vat:
-        df_clean["Summa"] = df_clean["Ilman ALV"]
+# How often the page polls the background pipeline while it is running
+PIPELINE_POLL_SECONDS = 0.3
 
-    summary_df  = compute_company_summary(df_clean)
-    monthly_tbl = monthly_totals(df_clean)
-    return df_clean, summary_df, monthly_tbl
+# Valinnaisten vaiheiden nimet virheilmoituksiin (pipeline.OPTIONAL_STAGES)
+STAGE_LABELS = {
+    "alerts": "Kustannusmuutosten haku",
+    "matrix": "Kuukausimatriisin tallennus",
+}
+
+
+def _while_running(func, polling: bool):
+    """
+    Wrap `func` as a fragment that reruns on its own every
+    PIPELINE_POLL_SECONDS while the background job is working, so polling
+    does not rerun the whole page.
+    """
+    return st.fragment(func, run_every=PIPELINE_POLL_SECONDS if polling else None)
+
+
+def _pipeline_progress(job, polling: bool) -> None:
+    results = job.results()
+    progress = []
+    if "rows" in results:
+        progress.append(f"📂 Luettu {results['rows']} riviä")
+    if "monthly_tbl" in results:
+        n_comp = results["monthly_tbl"]["Y-tunnus"].nunique()
+        progress.append(f"📅 Kuukausisummat laskettu ({n_comp} yritystä)")
+    if "flags" in results:
+        flags_df = results["flags"]
+        progress.append(
+            f"🚩 Oletuskynnyksillä: {int(flags_df['High Volatility'].sum())} korkea volatiliteetti, "
+            f"{int(flags_df['Strong Growth'].sum())} voimakas kasvu, "
+            f"{int(flags_df['StrongDecline'].sum())} voimakas lasku"
+        )
+    if progress:
+        st.caption(" · ".join(progress))
+
+    # Taustatyö valmistui (tai kaatui) → yksi koko sivun päivitys, jotta
+    # matriisi ja virheet näkyvät muuallakin ja pollaus loppuu
+    if polling and job.done():
+        st.rerun()
+
+
+def _cost_change_alerts(job, monthly_tbl, summary_df) -> None:
+    # Hälytykset ja matriisivarasto ovat lisäominaisuuksia: niiden virhe
+    # näytetään varoituksena tässä, muu sivu toimii normaalisti.
+    results = job.results()
+    stage_errors = job.stage_errors()
+    if not ("alerts" in results or stage_errors) or monthly_tbl.empty:
+        return
+
+    last_month = monthly_tbl["Kuukausi"].max()
+    title = f"🚨 Kustannusmuutokset {last_month:%b-%Y}"
+    if "alerts" in results:
+        alerts = results["alerts"]
+        alerts = alerts[
+            (alerts["Kuukausi"] == last_month)
+            & alerts["Y-tunnus"].isin(summary_df["Y-tunnus"])
+        ]
+        title += f" ({len(alerts)})"
+    with st.expander(title, expanded=bool(stage_errors)):
+        for stage, ex in stage_errors.items():
+            st.warning(f"⚠️ {STAGE_LABELS.get(stage, stage)} epäonnistui: {ex}")
+        if "alerts" in results:
+            alerts_localized = (
+                alerts
+                .drop(columns=["Kuukausi"])
+                .assign(Direction=alerts["Direction"].map({"Up": "Nousu", "Down": "Lasku"}))
+                .rename(columns={
+                    "MonthlySum": "Kuukauden summa",
+                    "PrevMonth": "Edellinen kuukausi",
+                    "Change": "Muutos",
+                    "ChangePct": "Muutos-%",
+                    "ZScore": "Z-arvo",
+                    "Direction": "Suunta",
+                    "NewProducts": "Uudet tuotteet",
+                    "RemovedProducts": "Poistuneet tuotteet",
+                })
+            )
+            st.dataframe(
+                alerts_localized.style.format({
+                    "Kuukauden summa": "€{:.2f}",
+                    "Edellinen kuukausi": "€{:.2f}",
+                    "Muutos": "€{:+.2f}",
+                    "Muutos-%": "{:+.0%}",
+                    "Z-arvo": "{:.1f}",
+                }, na_rep=""),
+                hide_index=True
+            )
 
 # Sivun asetukset
 st.set_page_config(
@@ -51,7 +122,7 @@ st.set_page_config(
 # Make two columns, narrow one for logo, wide one for title
 col1, col2 = st.columns([1, 6])
 with col1:
-    st.image(logo, width=200)        # adjust width to taste
+    st.html(f'<img src="{_logo_data_uri()}" width="200" alt="Taopa">')
 with col2:
     st.title("Asiakkaiden ohjelmistokustannukset")
 
@@ -73,6 +144,13 @@ uploaded_file = st.file_uploader(
 )
 
 if uploaded_file:
+    import pandas as pd
+    from analytics import get_backend
+    from pricing import add_flags
+    from pipeline import ensure_job
+    from matrix_store import open_matrix_store
+    from utils import normalize_business_id, normalize_name, find_col
+
     try:
         # Lue tiedoston bitit
         data_bytes = uploaded_file.read()
@@ -111,25 +189,27 @@ if uploaded_file:
         )
 
 
-        df_clean, summary_df, monthly_tbl = prep_everything(data_bytes, use_vat)
+        # --- Taustalla ajettava käsittely ------------------------------------------
+        # Uusi tiedosto tai ALV-/päättyneet-valinnan muutos peruu vanhan ajon.
+        # Päättyneiden asiakkuuksien rajaus tehdään jo taustatyössä.
+        job = ensure_job(st.session_state, data_bytes, use_vat, show_ended)
+        if job.error is not None:
+            raise job.error
 
-        # --- Suodata pois päättyneet asiakkuudet, jos valinta EI ole päällä ----------
-        if not show_ended:
-            # Viimeisin kuukausi koko aineistossa, esim. 2025-05-01
-            last_period = df_clean["Kuukausi"].max()
-
-            # Yritykset, joilla on rivejä tuolle kuulle
-            active_ids = (
-                df_clean.loc[df_clean["Kuukausi"] == last_period, "Y-tunnus"]
-                .unique()
-            )
+        # Edistyminen päivittyy omana fragmenttinaan; koko sivu ajetaan
+        # uudelleen vain odotettaessa yhteenvetoa ja kun työ on valmis.
+        polling = not job.done()
+        _while_running(_pipeline_progress, polling)(job, polling)
 
-            # Pidä ainoastaan aktiivisten yritysten rivit
-            df_clean = df_clean[df_clean["Y-tunnus"].isin(active_ids)].copy()
+        results = job.results()
+        if "summary_df" not in results:
+            with st.spinner("⏳ Lasketaan yhteenvetoa …"):
+                time.sleep(PIPELINE_POLL_SECONDS)
+            st.rerun()
 
-            # Laske summary- ja monthly-taulut uudelleen rajatusta datasta
-            summary_df = compute_company_summary(df_clean)
-            monthly_tbl = monthly_totals(df_clean)
+        df_clean = results["df_clean"]
+        summary_df = results["summary_df"]
+        monthly_tbl = results["monthly_tbl"]
 
         # -----------------------------------------------------------
         # Poista hyvityslaskujen "asiakkaat" (negatiivinen keskiarvo)
@@ -181,8 +261,9 @@ if uploaded_file:
                     st.sidebar.success(f"Poissuljettu {removed_n} riviä ({removed_by}).")
 
                     # Recompute summaries from filtered data
-                    summary_df = compute_company_summary(df_clean)
-                    monthly_tbl = monthly_totals(df_clean)
+                    analytics_backend = get_backend()
+                    summary_df = analytics_backend.compute_company_summary(df_clean)
+                    monthly_tbl = analytics_backend.monthly_totals(df_clean)
 
             except Exception as _ex:
                 st.sidebar.warning(f"Poissulkemislistan lukeminen epäonnistui: {_ex}")
@@ -191,15 +272,15 @@ if uploaded_file:
         # Optional: Download filtered dataset
         @st.cache_data
         def _to_xlsx_bytes(df):
-            import io
-            output = io.BytesIO()
+            output = BytesIO()
             with pd.ExcelWriter(output, engine="openpyxl") as writer:
                 df.to_excel(writer, index=False)
             return output.getvalue()
 
+        # Excel (openpyxl) kirjoitetaan vasta, kun painiketta klikataan
         st.sidebar.download_button(
             "Lataa suodatettu Excel",
-            data=_to_xlsx_bytes(df_clean),
+            data=partial(_to_xlsx_bytes, df_clean),
             file_name="filtered_dataset.xlsx",
             mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
         )
@@ -312,6 +393,9 @@ if uploaded_file:
         else:
             selected = sel or []
 
+        # — KUSTANNUSMUUTOKSET VIIMEISIMMÄLLÄ KUUKAUDELLA —
+        _while_running(_cost_change_alerts, polling)(job, monthly_tbl, summary_df)
+
         # — DETALJINÄKYMÄ VALITULLE YRITYKSELLE —
         if selected:
             row = selected[0]
@@ -321,11 +405,22 @@ if uploaded_file:
             st.markdown("---")
             st.subheader(f"📊 Lisätiedot: {comp_name}")
 
-            # 1) Kulujen kehitys kuukausittain
-            series = (
-                monthly_tbl.query("`Y-tunnus` == @comp_id")
-                .set_index("Kuukausi")["MonthlySum"]
-            )
+            # 1) Kulujen kehitys kuukausittain (ohjelmistoittain)
+            store = None
+            if "matrix" in results:
+                try:
+                    store = open_matrix_store(results["matrix"])
+                except OSError:
+                    pass  # varasto on jo siivottu pois → lasketaan monthly_tbl:stä
+            if store is not None and comp_id in store:
+                series = store.frame(comp_id)
+            else:
+                # sama muoto kuin store.frame: kuukaudet × ohjelmistot
+                series = (
+                    monthly_tbl.query("`Y-tunnus` == @comp_id")
+                    .pivot_table(index="Kuukausi", columns="Ohjelmisto",
+                                 values="MonthlySum", aggfunc="sum")
+                )
             st.subheader("Ohjelmistokustannukset kuukausittain")
             st.line_chart(series, height=250)
 
@@ -452,12 +547,14 @@ if uploaded_file:
                     else base[base['Yrityksen nimi'].isin(selected_companies)].copy()
                 )
 
-                # 2) laske **kaikki** liput
-                filtered['High Volatility'] = filtered['CV3Mo'] > vol_thresh
-                filtered['Strong Growth'] = filtered['GrowthRatio'] > growth_thresh
-                filtered['High Seasonality'] = filtered['Seasonality'] > season_thresh
-                # “Voimakas lasku” käänteinen kasvu:
-                filtered['StrongDecline'] = filtered['GrowthRatio'] < decline_thresh
+                # 2) laske **kaikki** liput (“Voimakas lasku” = käänteinen kasvu)
+                filtered = add_flags(
+                    filtered,
+                    vol_thresh=vol_thresh,
+                    growth_thresh=growth_thresh,
+                    decline_thresh=decline_thresh,
+                    season_thresh=season_thresh,
+                )
 
                 # 3) sovella vain LISÄASETUKSET‐suodattimet
                 if filter_low_vol:
@@ -0,0 +1,194 @@
+# app/matrix_store.py
+#
+# Compact on-disk form of monthly_totals: a float32 matrix of MonthlySum
+# (companies × months × programs) plus its axes. Written once per dataset
+# and opened with memory mapping, so worker processes share one copy in the
+# page cache and a company's history is a single slice.
+#
+# Stores live under one root directory (HINTALASKURI_MATRIX_DIR, default
+# $TMPDIR/hintalaskuri_matrix). Each write prunes the root to the
+# STORES_KEPT most recently used stores; readers of a pruned store fall
+# back to monthly_totals.
+
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+VALUES_FILE = "monthly_sum.npy"
+AXES_FILE = "axes.json"
+
+# Stores kept under the root; older ones are deleted when a new one is written
+STORES_KEPT = 8
+# Left-over ".tmp-" directories of crashed writers older than this are deleted
+STALE_TMP_SECONDS = 3600
+
+OPEN_CACHE_SIZE = 8
+_open_cache = OrderedDict()
+_open_lock = threading.Lock()
+
+
+def store_root() -> str:
+    return os.environ.get(
+        "HINTALASKURI_MATRIX_DIR",
+        os.path.join(tempfile.gettempdir(), "hintalaskuri_matrix"),
+    )
+
+
+def store_dir(key: str) -> str:
+    """Default location for the store of one dataset (pipeline job key)."""
+    return os.path.join(store_root(), key)
+
+
+def prune_stores(root: str, keep: int = None) -> list:
+    """
+    Delete all but the `keep` (default STORES_KEPT) most recently used
+    stores in `root` (by directory mtime) and stale temporary directories. Returns the deleted
+    paths. Errors are ignored: another process may be pruning too.
+    """
+    try:
+        entries = [e for e in os.scandir(root) if e.is_dir(follow_symlinks=False)]
+    except OSError:
+        return []
+
+    def mtime(entry):
+        try:
+            return entry.stat(follow_symlinks=False).st_mtime
+        except OSError:
+            return 0.0
+
+    if keep is None:
+        keep = STORES_KEPT
+    stale_before = time.time() - STALE_TMP_SECONDS
+    tmp = [e for e in entries if e.name.startswith(".tmp-") and mtime(e) < stale_before]
+    stores = sorted(
+        (e for e in entries if not e.name.startswith(".tmp-")), key=mtime, reverse=True
+    )
+    removed = [e.path for e in tmp + stores[keep:]]
+    for path in removed:
+        shutil.rmtree(path, ignore_errors=True)
+    return removed
+
+
+def write_matrix_store(monthly_tbl: pd.DataFrame, directory: str) -> str:
+    """
+    Write monthly_totals output to `directory` (skipped if it already exists).
+    Months without rows are NaN. The files are written to a temporary
+    directory and renamed into place, so readers never see a partial store.
+    """
+    if os.path.isdir(directory):
+        # mark as recently used so prune_stores keeps it
+        try:
+            os.utime(directory)
+        except OSError:
+            pass
+        return directory
+
+    mt = (
+        monthly_tbl
+        .groupby(['Y-tunnus', 'Ohjelmisto', 'Kuukausi'], as_index=False)['MonthlySum']
+        .sum()
+    )
+    ids = sorted(mt['Y-tunnus'].unique())
+    programs = sorted(mt['Ohjelmisto'].unique())
+    months = pd.date_range(mt['Kuukausi'].min(), mt['Kuukausi'].max(), freq='MS')
+    names = (
+        monthly_tbl.drop_duplicates('Y-tunnus')
+        .set_index('Y-tunnus')['Yrityksen nimi']
+        .reindex(ids)
+    )
+
+    values = np.full((len(ids), len(months), len(programs)), np.nan, dtype=np.float32)
+    values[
+        pd.Index(ids).get_indexer(mt['Y-tunnus']),
+        months.get_indexer(mt['Kuukausi']),
+        pd.Index(programs).get_indexer(mt['Ohjelmisto']),
+    ] = mt['MonthlySum'].to_numpy(dtype=np.float32)
+
+    parent = os.path.dirname(directory) or "."
+    os.makedirs(parent, exist_ok=True)
+    tmp = tempfile.mkdtemp(dir=parent, prefix=".tmp-")
+    try:
+        np.save(os.path.join(tmp, VALUES_FILE), values)
+        with open(os.path.join(tmp, AXES_FILE), "w", encoding="utf-8") as f:
+            json.dump({
+                'ids': ids,
+                'names': names.tolist(),
+                'months': [m.strftime('%Y-%m-%d') for m in months],
+                'programs': programs,
+            }, f, ensure_ascii=False)
+        os.rename(tmp, directory)
+    except OSError:
+        # another process won the race; its store is identical
+        if not os.path.isdir(directory):
+            raise
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    prune_stores(parent)
+    return directory
+
+
+class MatrixStore:
+    """Read-only, memory-mapped view of a store written by write_matrix_store."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.values = np.load(os.path.join(directory, VALUES_FILE), mmap_mode='r')
+        with open(os.path.join(directory, AXES_FILE), encoding="utf-8") as f:
+            axes = json.load(f)
+        self.ids = axes['ids']
+        self.names = axes['names']
+        self.months = pd.DatetimeIndex(axes['months'])
+        self.programs = axes['programs']
+        self._row = {cid: i for i, cid in enumerate(self.ids)}
+
+    def __contains__(self, company_id) -> bool:
+        return company_id in self._row
+
+    def frame(self, company_id) -> pd.DataFrame:
+        """
+        One company's MonthlySum as months × programs; months and programs
+        without any rows are left out (like filtering monthly_totals).
+        """
+        block = np.asarray(self.values[self._row[company_id]], dtype=float)
+        return (
+            pd.DataFrame(block, index=self.months, columns=self.programs)
+            .rename_axis('Kuukausi')
+            .dropna(how='all')
+            .dropna(axis=1, how='all')
+        )
+
+
+def open_matrix_store(directory: str) -> MatrixStore:
+    """
+    Open the store in `directory`, reusing an already opened one while its
+    values file is unchanged. Raises OSError (FileNotFoundError) when the
+    store has been pruned or deleted.
+    """
+    try:
+        st = os.stat(os.path.join(directory, VALUES_FILE))
+    except OSError:
+        with _open_lock:
+            _open_cache.pop(directory, None)
+        raise
+    stamp = (st.st_ino, st.st_mtime_ns)
+
+    with _open_lock:
+        cached = _open_cache.get(directory)
+        if cached is not None and cached[0] == stamp:
+            _open_cache.move_to_end(directory)
+            return cached[1]
+
+    store = MatrixStore(directory)
+    with _open_lock:
+        _open_cache[directory] = (stamp, store)
+        _open_cache.move_to_end(directory)
+        while len(_open_cache) > OPEN_CACHE_SIZE:
+            _open_cache.popitem(last=False)
+    return store
@@ -0,0 +1,255 @@
+# app/pipeline.py
+
+import hashlib
+import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from io import BytesIO
+
+import pandas as pd
+
+from parser import load_data, clean_dataframe
+from analytics import (
+    get_backend, partial_totals, merge_partials, totals_from_partials, cost_change_alerts
+)
+from pricing import add_flags
+from matrix_store import store_dir, write_matrix_store
+
+SHEETS = ["Netvisor + Procountor 2024-2025", "Fennoa 2024-2025"]
+
+# Stages in the order their results are published
+STAGES = ["rows", "df_clean", "monthly_tbl", "summary_df", "flags", "matrix", "alerts"]
+# Extras the page can do without: a failure is kept per stage in
+# PipelineJob.stage_errors() instead of failing the whole job
+OPTIONAL_STAGES = ["matrix", "alerts"]
+
+# Read + cleaned line items per (file, VAT), shared by all sessions of the
+# process, so toggling "show ended" or switching VAT back does not re-read
+# the workbook with openpyxl. Cached frames must not be modified in place.
+LINES_CACHE_SIZE = 4
+_lines_cache = OrderedDict()
+_lines_lock = threading.Lock()
+
+
+class JobCancelled(Exception):
+    """Raised inside the worker when a newer job has replaced this one."""
+
+
+def job_key(file_bytes: bytes, use_vat: bool, show_ended: bool) -> str:
+    """Identify a pipeline run by file content and the options that affect it."""
+    digest = hashlib.md5(file_bytes).hexdigest()
+    return f"{digest}-vat{int(use_vat)}-ended{int(show_ended)}"
+
+
+def read_sheets(source) -> pd.DataFrame:
+    """Read both bookkeeping sheets of one workbook into a single raw frame."""
+    frames = []
+    for sheet in SHEETS:
+        if isinstance(source, BytesIO):
+            source.seek(0)
+        frames.append(load_data(source, sheet_name=sheet))
+    return pd.concat(frames, ignore_index=True)
+
+
+def cached_lines(file_bytes: bytes, use_vat: bool) -> tuple:
+    """
+    (raw row count, cleaned line items) for one upload, read at most once
+    per (file, VAT) while it stays among the LINES_CACHE_SIZE latest.
+    """
+    key = (hashlib.md5(file_bytes).hexdigest(), use_vat)
+    with _lines_lock:
+        if key in _lines_cache:
+            _lines_cache.move_to_end(key)
+            return _lines_cache[key]
+
+    df_raw = read_sheets(BytesIO(file_bytes))
+    entry = (len(df_raw), prepare_lines(df_raw, use_vat))
+
+    with _lines_lock:
+        _lines_cache[key] = entry
+        while len(_lines_cache) > LINES_CACHE_SIZE:
+            _lines_cache.popitem(last=False)
+    return entry
+
+
+class PipelineJob:
+    """
+    Read → clean → aggregate one uploaded workbook in a background thread.
+    Each stage's result is published as soon as it is ready, so the UI can
+    render partial results while the rest is still being computed.
+    """
+
+    def __init__(self, file_bytes: bytes, use_vat: bool, show_ended: bool):
+        self.key = job_key(file_bytes, use_vat, show_ended)
+        self.error = None
+        self._file_bytes = file_bytes
+        self._use_vat = use_vat
+        self._show_ended = show_ended
+        self._results = {}
+        self._stage_errors = {}
+        self._lock = threading.Lock()
+        self._cancel = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name=f"pipeline-{self.key}", daemon=True
+        )
+
+    def start(self) -> "PipelineJob":
+        self._thread.start()
+        return self
+
+    def cancel(self) -> None:
+        self._cancel.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    def done(self) -> bool:
+        return self._thread.ident is not None and not self._thread.is_alive()
+
+    def results(self) -> dict:
+        """Snapshot of the stages finished so far."""
+        with self._lock:
+            return dict(self._results)
+
+    def stage_errors(self) -> dict:
+        """{stage: exception} for the optional stages that failed."""
+        with self._lock:
+            return dict(self._stage_errors)
+
+    def _publish(self, stage: str, value) -> None:
+        if stage not in STAGES:
+            raise ValueError(f"Unknown pipeline stage: {stage!r}")
+        if self._cancel.is_set():
+            raise JobCancelled(self.key)
+        with self._lock:
+            self._results[stage] = value
+
+    def _publish_optional(self, stage: str, compute) -> None:
+        """Publish compute() for an OPTIONAL_STAGES stage, keeping its error."""
+        if stage not in OPTIONAL_STAGES:
+            raise ValueError(f"Not an optional pipeline stage: {stage!r}")
+        if self.cancelled:
+            # don't write a matrix store or compute alerts for a stale job
+            raise JobCancelled(self.key)
+        try:
+            value = compute()
+        except Exception as ex:
+            with self._lock:
+                self._stage_errors[stage] = ex
+            return
+        self._publish(stage, value)
+
+    def _run(self) -> None:
+        try:
+            n_rows, df_clean = cached_lines(self._file_bytes, self._use_vat)
+            self._publish("rows", n_rows)
+
+            if not self._show_ended:
+                df_clean = active_only(df_clean)
+            self._publish("df_clean", df_clean)
+
+            backend = get_backend()
+            monthly_tbl = backend.monthly_totals(df_clean)
+            self._publish("monthly_tbl", monthly_tbl)
+
+            summary_df = backend.summarize_monthly(monthly_tbl)
+            self._publish("summary_df", summary_df)
+
+            self._publish("flags", add_flags(summary_df))
+
+            # directory of the memory-mapped company × month × program store
+            if not monthly_tbl.empty:
+                self._publish_optional(
+                    "matrix", lambda: write_matrix_store(monthly_tbl, store_dir(self.key))
+                )
+
+            self._publish_optional("alerts", lambda: cost_change_alerts(monthly_tbl, df_clean))
+        except JobCancelled:
+            pass
+        except Exception as ex:
+            self.error = ex
+
+
+def prepare_lines(df_raw: pd.DataFrame, use_vat: bool) -> pd.DataFrame:
+    """
+    Clean raw line items, drop ':'-prefixed pseudo companies and pick the
+    amount column according to the VAT option.
+    """
+    df_clean = clean_dataframe(df_raw)
+
+    # ----- DROP rows where company name starts with ":" ---------------
+    df_clean = df_clean[
+        ~df_clean["Yrityksen nimi"].str.startswith(":", na=False)
+    ].copy()
+
+    if not use_vat:
+        df_clean["Summa"] = df_clean["Ilman ALV"]
+    return df_clean
+
+
+def active_only(df_clean: pd.DataFrame) -> pd.DataFrame:
+    """Keep only companies that have rows for the latest month in the data."""
+    last_period = df_clean["Kuukausi"].max()
+    active_ids = (
+        df_clean.loc[df_clean["Kuukausi"] == last_period, "Y-tunnus"]
+        .unique()
+    )
+    return df_clean[df_clean["Y-tunnus"].isin(active_ids)].copy()
+
+
+def partial_for_source(source, sheet_name, use_vat: bool) -> pd.DataFrame:
+    """Read, clean and reduce one sheet to a partial aggregate."""
+    return partial_totals(prepare_lines(load_data(source, sheet_name=sheet_name), use_vat))
+
+
+def aggregate_sources(sources, use_vat: bool = False, max_workers: int = None) -> pd.DataFrame:
+    """
+    Merge many exports (one (path, sheet_name) pair per system/year) into a
+    single partial aggregate. Each sheet is processed in its own worker
+    process and merged as soon as it finishes, so only one sheet's line
+    items plus the running aggregate are in memory per worker.
+    Use analytics.totals_from_partials on the result for monthly_totals.
+    """
+    merged = None
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        futures = [
+            pool.submit(partial_for_source, path, sheet, use_vat)
+            for path, sheet in sources
+        ]
+        for fut in as_completed(futures):
+            part = fut.result()
+            merged = part if merged is None else merge_partials([merged, part])
+    return merged if merged is not None else merge_partials([])
+
+
+def ensure_job(state, file_bytes: bytes, use_vat: bool, show_ended: bool) -> PipelineJob:
+    """
+    Return the job for the current upload/options from `state`
+    (st.session_state), cancelling and replacing a stale one.
+    """
+    key = job_key(file_bytes, use_vat, show_ended)
+    job = state.get("pipeline_job")
+    if job is not None and job.key == key:
+        return job
+    if job is not None:
+        job.cancel()
+    job = PipelineJob(file_bytes, use_vat, show_ended).start()
+    state["pipeline_job"] = job
+    return job
+
+
+if __name__ == '__main__':
+    # aggregate every sheet of the given workbooks:
+    #   python app/pipeline.py np_2024.xlsx fennoa_2024.xlsx np_2025.xlsx …
+    if len(sys.argv) < 2:
+        sys.exit("käyttö: python app/pipeline.py TYÖKIRJA.xlsx [TYÖKIRJA.xlsx …]")
+    sources = [
+        (path, sheet)
+        for path in sys.argv[1:]
+        for sheet in pd.ExcelFile(path, engine='openpyxl').sheet_names
+    ]
+    merged = aggregate_sources(sources)
+    print(f"{len(sources)} välilehteä, {int(merged['Rows'].sum())} riviä")
+    print(totals_from_partials(merged).head())
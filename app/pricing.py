@@ -37,6 +37,26 @@ def add_fixed_price_suggestions(
     return df
 
 
+def add_flags(
+        df: pd.DataFrame,
+        vol_thresh: float = 0.25,
+        growth_thresh: float = 1.20,
+        decline_thresh: float = 0.80,
+        season_thresh: float = 2.0
+) -> pd.DataFrame:
+    """
+    Add boolean indicator columns to a company summary:
+    'High Volatility', 'Strong Growth', 'StrongDecline', 'High Seasonality'.
+    Defaults match the sliders in the pricing form.
+    """
+    df = df.copy()
+    df['High Volatility'] = df['CV3Mo'] > vol_thresh
+    df['Strong Growth'] = df['GrowthRatio'] > growth_thresh
+    df['High Seasonality'] = df['Seasonality'] > season_thresh
+    df['StrongDecline'] = df['GrowthRatio'] < decline_thresh
+    return df
+
+
 if __name__ == "__main__":
     # smoke test using analytics module
     from parser import load_data, clean_dataframe
@@ -0,0 +1,215 @@
+# benchmarks/bench_rerun.py
+#
+# End-to-end rerun latency of app/main.py, driven headlessly with
+# streamlit.testing's AppTest. Generates workbooks of several sizes, runs
+# the typical interactions and fails (exit code 1) when a median rerun time
+# exceeds its budget.
+#
+#   python benchmarks/bench_rerun.py
+#   python benchmarks/bench_rerun.py --sizes 100 1000 --repeat 5 --json out.json
+#
+# AppTest cannot upload files or click inside the AgGrid component, so the
+# main-page st.file_uploader and st_aggrid.AgGrid are patched: the uploader
+# returns the generated workbook and AgGrid returns the requested selection.
+# Everything else in main.py (filters, renames, grid option building,
+# Styler formatting, the background pipeline) runs for real.
+
+import argparse
+import io
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from unittest import mock
+
+import pandas as pd
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_DIR = os.path.join(REPO_ROOT, "app")
+MAIN = os.path.join(APP_DIR, "main.py")
+
+SHEETS = {
+    "Netvisor + Procountor 2024-2025": ["Netvisor", "Procountor"],
+    "Fennoa 2024-2025": ["Fennoa"],
+}
+
+# Median rerun budget in seconds per interaction, by number of companies
+# per sheet: roughly 1.5x the measured times.
+# Sizes between the listed ones use the next larger budget; larger sizes
+# scale the largest budget linearly.
+BUDGETS = {
+    100: {
+        "upload": 5.0, "toggle_vat": 5.0, "toggle_show_ended": 5.0,
+        "select_company": 1.5, "change_month": 1.0, "submit_pricing": 1.5,
+    },
+    1000: {
+        "upload": 32.0, "toggle_vat": 32.0, "toggle_show_ended": 32.0,
+        "select_company": 1.5, "change_month": 1.0, "submit_pricing": 4.5,
+    },
+}
+
+
+def make_workbook(n_companies: int, months: int = 18, seed: int = 0) -> bytes:
+    """Synthetic export with both sheets in the layout main.py expects."""
+    rnd = random.Random(seed)
+    periods = pd.date_range("2024-01-01", periods=months, freq="MS")
+    buf = io.BytesIO()
+    with pd.ExcelWriter(buf, engine="openpyxl") as writer:
+        for sheet, programs in SHEETS.items():
+            rows = []
+            for c in range(n_companies):
+                program = rnd.choice(programs)
+                start = rnd.randrange(0, months // 2)
+                # ~20 % of customers have ended before the last month
+                end = rnd.randrange(start + 1, months) if rnd.random() < 0.2 else months
+                for m in periods[start:end]:
+                    for p in range(rnd.randint(1, 4)):
+                        qty = rnd.randint(1, 5)
+                        price = rnd.choice([5.0, 12.5, 30.0, 49.9])
+                        net = qty * price
+                        rows.append({
+                            "Y-tunnus": f"{sheet[0]}{c:06d}-{c % 10}",
+                            "Yrityksen nimi": f"Yritys {sheet[0]}{c}",
+                            "Ohjelmisto": program,
+                            "Kuukausi": m.strftime("%b-%y"),
+                            "Tuotekoodi": f"P{p}",
+                            "Tuote": f"Tuote {p}",
+                            "Määrä": qty,
+                            "Hinta": f"{price:.2f} €".replace(".", ","),
+                            "Alennus-%": 0,
+                            "Veroprosentti (%)": 25.5,
+                            "Ilman ALV": net,
+                            "ALV": round(net * 0.255, 2),
+                            "Summa": round(net * 1.255, 2),
+                        })
+            pd.DataFrame(rows).to_excel(writer, sheet_name=sheet, index=False)
+    return buf.getvalue()
+
+
+class _Upload:
+    """Stand-in for Streamlit's UploadedFile."""
+
+    def __init__(self, data: bytes):
+        self.name = "bench.xlsx"
+        self._data = data
+
+    def read(self) -> bytes:
+        return self._data
+
+
+class _Grid:
+    """Patched AgGrid: returns the first row as selected when asked to."""
+
+    def __init__(self):
+        self.select_first = False
+
+    def __call__(self, data, *args, **kwargs):
+        selected = data.head(1).to_dict("records") if self.select_first else []
+        return {"data": data, "selected_rows": selected}
+
+
+def _by_label(elements, label):
+    for el in elements:
+        if el.label == label:
+            return el
+    raise LookupError(f"widget not found: {label!r}")
+
+
+def _timed(at) -> float:
+    t0 = time.perf_counter()
+    at.run()
+    elapsed = time.perf_counter() - t0
+    if at.exception:
+        raise RuntimeError(at.exception[0].value)
+    errors = [e.value for e in at.error]
+    if errors:
+        raise RuntimeError(errors[0])
+    return elapsed
+
+
+def run_session(data: bytes, timeout: float) -> dict:
+    """One fresh session going through every interaction once."""
+    import streamlit
+    import st_aggrid
+    from streamlit.testing.v1 import AppTest
+
+    grid = _Grid()
+    timings = {}
+    with mock.patch.object(streamlit, "file_uploader", lambda *a, **k: _Upload(data)), \
+            mock.patch.object(st_aggrid, "AgGrid", grid):
+        at = AppTest.from_file(MAIN, default_timeout=timeout)
+        timings["upload"] = _timed(at)
+
+        _by_label(at.checkbox, "ALV-hinta").check()
+        timings["toggle_vat"] = _timed(at)
+
+        _by_label(at.checkbox, "Näytä päättyneet asiakkuudet").check()
+        timings["toggle_show_ended"] = _timed(at)
+
+        grid.select_first = True
+        timings["select_company"] = _timed(at)
+
+        _by_label(at.selectbox, "Valitse kuukausi erittelyyn").set_value(
+            _by_label(at.selectbox, "Valitse kuukausi erittelyyn").options[0]
+        )
+        timings["change_month"] = _timed(at)
+
+        _by_label(at.button, "Laske hinnoittelu").click()
+        timings["submit_pricing"] = _timed(at)
+    return timings
+
+
+def budget_for(size: int) -> dict:
+    for limit in sorted(BUDGETS):
+        if size <= limit:
+            return BUDGETS[limit]
+    largest = max(BUDGETS)
+    return {k: v * size / largest for k, v in BUDGETS[largest].items()}
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Rerun latency benchmark for app/main.py")
+    ap.add_argument("--sizes", type=int, nargs="+", default=[100, 1000],
+                    help="companies per sheet in the generated workbooks")
+    ap.add_argument("--repeat", type=int, default=3,
+                    help="fresh sessions per size; the median is compared")
+    ap.add_argument("--budget-scale", type=float, default=1.0,
+                    help="multiply all budgets, e.g. 2.0 on slow CI machines")
+    ap.add_argument("--timeout", type=float, default=300.0)
+    ap.add_argument("--json", help="write the measurements to this file")
+    args = ap.parse_args(argv)
+
+    # main.py imports its siblings flat and opens the logo relative to the repo
+    sys.path.insert(0, APP_DIR)
+    os.chdir(REPO_ROOT)
+
+    report, failures = [], []
+    for size in args.sizes:
+        data = make_workbook(size)
+        runs = [run_session(data, args.timeout) for _ in range(args.repeat)]
+        budget = budget_for(size)
+        for name in runs[0]:
+            median = statistics.median(r[name] for r in runs)
+            limit = budget[name] * args.budget_scale
+            ok = median <= limit
+            report.append({"size": size, "interaction": name,
+                           "median_s": round(median, 3), "budget_s": limit, "ok": ok})
+            print(f"{size:>6} yritystä  {name:<18} {median:7.3f} s "
+                  f"(budjetti {limit:.1f} s){'' if ok else '  ← YLITTYI'}")
+            if not ok:
+                failures.append((size, name))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+    if failures:
+        print(f"{len(failures)} vuorovaikutusta ylitti budjetin.")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,97 @@
+# benchmarks/importtime_budget.py
+#
+# Cold-start import budget for app/main.py, measured with `python -X importtime`.
+# Runs the page script once in Streamlit's bare mode (no file uploaded, i.e.
+# what a new session does before the uploader shows) in a fresh interpreter
+# and fails (exit code 1) when
+#   - a heavy module from LAZY_MODULES is imported on that path, or
+#   - the import time on top of `import streamlit` exceeds the budget.
+#
+#   python benchmarks/importtime_budget.py
+#   python benchmarks/importtime_budget.py --budget-ms 250 --top 15
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAIN = os.path.join(REPO_ROOT, "app", "main.py")
+
+# Must only be imported once a file has been uploaded (or a button clicked)
+LAZY_MODULES = [
+    "pandas", "numpy", "openpyxl", "PIL", "st_aggrid",
+    "statsmodels", "duckdb", "pyarrow",
+]
+
+# Import time allowed on top of streamlit's own imports
+DEFAULT_BUDGET_MS = 50.0
+
+_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def importtime(code: str, repeat: int) -> dict:
+    """
+    Run `code` in fresh interpreters with -X importtime and return
+    {module: self time in µs}, the minimum over `repeat` runs.
+    """
+    best = None
+    for _ in range(repeat):
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", code],
+            cwd=REPO_ROOT, capture_output=True, text=True,
+        )
+        if proc.returncode != 0:
+            raise RuntimeError(proc.stderr[-2000:])
+        times = {}
+        for line in proc.stderr.splitlines():
+            m = _LINE.match(line)
+            if m:
+                times[m.group(4)] = int(m.group(1))
+        if best is None:
+            best = times
+        else:
+            best = {k: min(v, best.get(k, v)) for k, v in times.items()}
+    return best
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Import-time budget for app/main.py")
+    ap.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS,
+                    help="allowed import time on top of `import streamlit`")
+    ap.add_argument("--repeat", type=int, default=3,
+                    help="fresh interpreters per measurement; the minimum is used")
+    ap.add_argument("--top", type=int, default=10,
+                    help="print the N slowest app-specific imports")
+    args = ap.parse_args(argv)
+
+    baseline = importtime("import streamlit", args.repeat)
+    app = importtime(
+        "import runpy, sys; sys.path.insert(0, 'app'); "
+        f"runpy.run_path({MAIN!r}, run_name='__main__')",
+        args.repeat,
+    )
+
+    failures = []
+    loaded_lazy = sorted(m for m in LAZY_MODULES if m in app and m not in baseline)
+    if loaded_lazy:
+        failures.append(f"tuotu ennen latausta: {', '.join(loaded_lazy)}")
+
+    extra = {m: t for m, t in app.items() if m not in baseline}
+    extra_ms = sum(extra.values()) / 1000
+    base_ms = sum(baseline.values()) / 1000
+    print(f"import streamlit:        {base_ms:8.1f} ms")
+    print(f"app/main.py (lisäksi):   {extra_ms:8.1f} ms  (budjetti {args.budget_ms:.0f} ms)")
+    for mod, t in sorted(extra.items(), key=lambda kv: -kv[1])[:args.top]:
+        print(f"  {t / 1000:8.1f} ms  {mod}")
+    if extra_ms > args.budget_ms:
+        failures.append(f"tuontiaika {extra_ms:.1f} ms > {args.budget_ms:.0f} ms")
+
+    for f in failures:
+        print(f"YLITTYI: {f}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+# tests/conftest.py
+
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# app/ modules import each other flat (as under `streamlit run app/main.py`)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "app"))
+
+
+@pytest.fixture
+def lines() -> pd.DataFrame:
+    """
+    Cleaned line items covering the awkward cases: gap months, NaN amounts,
+    a company with several programs, an all-zero company, negative amounts
+    and series shorter / longer than the 12-month windows.
+    """
+    rng = np.random.default_rng(0)
+    months = pd.date_range('2023-01-01', periods=30, freq='MS')
+    rows = []
+
+    def add(cid, name, program, month_idx, amount):
+        rows.append({
+            'Y-tunnus': cid,
+            'Yrityksen nimi': name,
+            'Ohjelmisto': program,
+            'Kuukausi': months[month_idx],
+            'Tuote': f'Tuote {len(rows) % 4}',
+            'Summa': amount,
+        })
+
+    for c in range(60):
+        n = int(rng.integers(1, len(months) + 1))
+        start = int(rng.integers(0, len(months) - n + 1))
+        for i in range(start, start + n):
+            for _ in range(int(rng.integers(1, 4))):
+                add(f'{c:07d}-{c % 10}', f'Yritys {c}',
+                    ['Netvisor', 'Procountor', 'Fennoa'][c % 3],
+                    i, float(rng.normal(100, 40)))
+
+    # gap months (no rows in months 5-8 and 15)
+    for i in [0, 1, 2, 3, 4, 9, 10, 11, 12, 13, 14, 16, 17, 18, 19]:
+        add('1000000-1', 'Aukollinen Oy', 'Netvisor', i, 50.0 + i)
+    # NaN amounts, one month entirely NaN
+    for i in range(14):
+        add('1000001-2', 'Puuttuva Oy', 'Fennoa', i, np.nan if i in (3, 7) else 80.0)
+        if i == 5:
+            add('1000001-2', 'Puuttuva Oy', 'Fennoa', i, np.nan)
+    # several programs for one company
+    for i in range(20):
+        add('1000002-3', 'Monta Oy', 'Netvisor', i, 30.0 + i)
+        if i % 2 == 0:
+            add('1000002-3', 'Monta Oy', 'Procountor', i, 200.0 - i)
+    # all-zero company
+    for i in range(8):
+        add('1000003-4', 'Nolla Oy', 'Procountor', i, 0.0)
+    # credit notes
+    for i in range(6):
+        add('1000004-5', 'Hyvitys Oy', 'Netvisor', i, -25.0)
+
+    return pd.DataFrame(rows)
+
+
+@pytest.fixture
+def write_workbook():
+    """Write line items as an upload workbook (both SHEETS, half the rows each)."""
+    from pipeline import SHEETS
+
+    def write(path, lines):
+        raw = lines.assign(
+            Kuukausi=lines['Kuukausi'].dt.strftime('%b-%y'),
+            Tuotekoodi='P1', Määrä=1, Hinta='1,00', **{
+                'Alennus-%': 0, 'Veroprosentti (%)': 25.5,
+                'Ilman ALV': lines['Summa'], 'ALV': 0.0,
+            },
+        )
+        half = len(raw) // 2
+        with pd.ExcelWriter(path, engine='openpyxl') as writer:
+            raw.iloc[:half].to_excel(writer, sheet_name=SHEETS[0], index=False)
+            raw.iloc[half:].to_excel(writer, sheet_name=SHEETS[1], index=False)
+        return path
+
+    return write
@@ -0,0 +1,137 @@
+# tests/test_analytics.py
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import analytics
+from pipeline import SHEETS, aggregate_sources, prepare_lines, read_sheets
+
+
+def chunks(df: pd.DataFrame, n: int, seed: int = 0):
+    order = np.random.default_rng(seed).permutation(len(df))
+    return [df.iloc[idx] for idx in np.array_split(order, n)]
+
+
+def test_partials_merge_to_monthly_totals(lines):
+    merged = analytics.merge_partials(analytics.partial_totals(c) for c in chunks(lines, 5))
+    pd.testing.assert_frame_equal(
+        analytics.totals_from_partials(merged), analytics.monthly_totals(lines)
+    )
+    assert merged['Rows'].sum() == len(lines)
+
+
+def test_merge_partials_is_associative(lines):
+    a, b, c = (analytics.partial_totals(x) for x in chunks(lines, 3, seed=1))
+    left = analytics.merge_partials([analytics.merge_partials([a, b]), c])
+    right = analytics.merge_partials([a, analytics.merge_partials([c, b])])
+    flat = analytics.merge_partials([a, b, c])
+    pd.testing.assert_frame_equal(left, flat)
+    pd.testing.assert_frame_equal(right, flat)
+
+
+def test_summary_from_merged_partials(lines):
+    merged = analytics.merge_partials(analytics.partial_totals(c) for c in chunks(lines, 4))
+    pd.testing.assert_frame_equal(
+        analytics.summarize_monthly(analytics.totals_from_partials(merged)),
+        analytics.compute_company_summary(lines),
+    )
+
+
+def test_merge_partials_empty():
+    assert list(analytics.merge_partials([]).columns) == analytics.PARTIAL_KEYS + ['Sum', 'Rows']
+
+
+def test_aggregate_sources_matches_single_pass(lines, tmp_path, write_workbook):
+    path = write_workbook(tmp_path / 'export.xlsx', lines)
+    merged = aggregate_sources([(path, s) for s in SHEETS], max_workers=2)
+    expected = analytics.monthly_totals(prepare_lines(read_sheets(path), use_vat=False))
+    pd.testing.assert_frame_equal(analytics.totals_from_partials(merged), expected)
+
+
+def test_aggregate_sources_empty():
+    assert aggregate_sources([]).empty
+
+
+def _spike(lines):
+    """Extra company whose cost jumps in its last month, with numeric product codes."""
+    months = pd.date_range('2023-01-01', periods=9, freq='MS')
+    rows = [
+        {'Y-tunnus': '1000005-6', 'Yrityksen nimi': 'Numero Oy', 'Ohjelmisto': 'Fennoa',
+         'Kuukausi': m, 'Tuote': 100, 'Summa': 50.0}
+        for m in months
+    ]
+    rows.append({**rows[-1], 'Tuote': 200, 'Summa': 500.0})
+    return pd.concat([lines, pd.DataFrame(rows)], ignore_index=True)
+
+
+def test_alerts_with_numeric_product_names(lines):
+    df = _spike(lines)
+    alerts = analytics.cost_change_alerts(analytics.monthly_totals(df), df)
+    hit = alerts[alerts['Y-tunnus'] == '1000005-6']
+    assert len(hit) == 1
+    assert hit.iloc[0]['Direction'] == 'Up'
+    assert hit.iloc[0]['NewProducts'] == '200'
+    assert hit.iloc[0]['RemovedProducts'] == ''
+
+
+def test_alerts_empty_input(lines):
+    empty = lines.iloc[:0]
+    alerts = analytics.cost_change_alerts(analytics.monthly_totals(empty), empty)
+    assert alerts.empty
+    assert list(alerts.columns) == analytics.ALERT_COLS + analytics.PRODUCT_COLS
+    no_products = analytics.cost_change_alerts(analytics.monthly_totals(empty))
+    assert list(no_products.columns) == analytics.ALERT_COLS
+
+
+def _monthly(series: dict) -> pd.DataFrame:
+    """monthly_totals-shaped frame from {Y-tunnus: {month index: sum}}."""
+    months = pd.date_range('2024-01-01', periods=24, freq='MS')
+    return pd.DataFrame([
+        {'Y-tunnus': cid, 'Yrityksen nimi': f'Yritys {cid}', 'Ohjelmisto': 'Netvisor',
+         'Kuukausi': months[i], 'MonthlySum': float(amount)}
+        for cid, values in series.items()
+        for i, amount in values.items()
+    ])
+
+
+def test_alerts_zscore_gaps_and_ranking():
+    noise = {i: 100 + (-1) ** i for i in range(13)}     # 101, 99, 101, …
+    mt = _monthly({
+        'A': {**noise, 13: 120.0},                        # +19 €, +19 %: z only
+        'B': {**noise, 13: 112.0},                        # smaller z jump
+        'C': {i: 100.0 for i in range(6) if i != 3},      # gap in month 3
+    })
+    alerts = analytics.cost_change_alerts(mt)
+
+    assert list(alerts['Y-tunnus']) == ['A', 'B', 'C']
+    history = np.array([noise[i] for i in range(1, 13)])
+    sd = history.std(ddof=1) * np.sqrt(1 + 1 / 12)
+    assert alerts.loc[0, 'ZScore'] == pytest.approx((120 - history.mean()) / sd)
+    assert alerts.loc[1, 'ZScore'] == pytest.approx((112 - history.mean()) / sd)
+    assert abs(alerts.loc[0, 'ChangePct']) < 0.5
+
+    # the gap month counts as 0 € (a -100 % drop); too short a history for z
+    gap = alerts.iloc[2]
+    assert gap['Kuukausi'] == pd.Timestamp('2024-04-01')
+    assert gap[['MonthlySum', 'PrevMonth', 'Change', 'ChangePct']].tolist() == [0.0, 100.0, -100.0, -1.0]
+    assert gap['Direction'] == 'Down'
+    assert np.isnan(gap['ZScore'])
+
+    only = analytics.cost_change_alerts(mt, month='2024-04-01')
+    assert list(only['Y-tunnus']) == ['C']
+
+
+def test_alerts_quiet_on_stationary_noise():
+    rng = np.random.default_rng(0)
+    n_companies, n_months = 2000, 36
+    months = pd.date_range('2022-01-01', periods=n_months, freq='MS')
+    mt = pd.DataFrame({
+        'Y-tunnus': np.repeat([f'{c:07d}-0' for c in range(n_companies)], n_months),
+        'Yrityksen nimi': 'Kohina Oy',
+        'Ohjelmisto': 'Netvisor',
+        'Kuukausi': np.tile(months, n_companies),
+        'MonthlySum': rng.normal(100, 10, n_companies * n_months),
+    })
+    alerts = analytics.cost_change_alerts(mt)
+    assert len(alerts) / (n_companies * n_months) < 0.002
@@ -0,0 +1,76 @@
+# tests/test_analytics_sql.py
+#
+# Parity of the DuckDB backend with the pandas implementation.
+
+import pandas as pd
+import pytest
+
+import analytics
+
+pytest.importorskip("duckdb")
+import analytics_sql  # noqa: E402
+
+COLUMNS = ['Y-tunnus', 'Yrityksen nimi', 'Ohjelmisto', 'Kuukausi', 'Summa']
+
+
+def assert_same(actual: pd.DataFrame, expected: pd.DataFrame):
+    pd.testing.assert_frame_equal(
+        actual.reset_index(drop=True),
+        expected.reset_index(drop=True),
+        check_dtype=False,
+        rtol=1e-9,
+    )
+
+
+def test_monthly_totals_parity(lines):
+    assert_same(analytics_sql.monthly_totals(lines), analytics.monthly_totals(lines))
+
+
+def test_compute_company_summary_parity(lines):
+    assert_same(
+        analytics_sql.compute_company_summary(lines),
+        analytics.compute_company_summary(lines),
+    )
+
+
+def test_summarize_monthly_parity(lines):
+    mt = analytics.monthly_totals(lines)
+    assert_same(analytics_sql.summarize_monthly(mt), analytics.summarize_monthly(mt))
+
+
+def test_edge_cases_are_covered(lines):
+    summary = analytics_sql.compute_company_summary(lines).set_index(['Y-tunnus', 'Program'])
+    # all-zero company: `x or 1` guards hold, no NaN/inf
+    assert summary.loc[('1000003-4', 'Procountor'), 'AvgAll'] == 0
+    assert summary.loc[('1000003-4', 'Procountor'), 'CV3Mo'] == 0
+    # one row per program
+    assert {'Netvisor', 'Procountor'} <= set(summary.loc['1000002-3'].index)
+
+
+def test_arrow_table_input(lines):
+    pa = pytest.importorskip("pyarrow")
+    table = pa.Table.from_pandas(lines[COLUMNS], preserve_index=False)
+    assert_same(analytics_sql.monthly_totals(table), analytics.monthly_totals(lines))
+    assert_same(
+        analytics_sql.compute_company_summary(table),
+        analytics.compute_company_summary(lines),
+    )
+
+
+def test_parquet_path_input(lines, tmp_path):
+    pytest.importorskip("pyarrow")
+    path = tmp_path / "lines.parquet"
+    lines[COLUMNS].to_parquet(path, index=False)
+    assert_same(analytics_sql.monthly_totals(path), analytics.monthly_totals(lines))
+    assert_same(
+        analytics_sql.compute_company_summary(str(path)),
+        analytics.compute_company_summary(lines),
+    )
+
+
+def test_backend_selection(monkeypatch):
+    monkeypatch.setenv('ANALYTICS_BACKEND', 'duckdb')
+    assert analytics.get_backend() is analytics_sql
+    assert analytics.get_backend('pandas') is analytics
+    with pytest.raises(ValueError):
+        analytics.get_backend('spark')
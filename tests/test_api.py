@@ -0,0 +1,131 @@
+# tests/test_api.py
+
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.client import HTTPConnection
+
+import pandas as pd
+import pytest
+
+from api import PriceBook, PricingService, _parse_params, _price_record, make_server
+from pricing import add_flags
+import analytics
+
+
+@pytest.fixture
+def book(lines):
+    return PriceBook(add_flags(analytics.compute_company_summary(lines)), 'test', 0.0)
+
+
+@pytest.fixture
+def server(lines, tmp_path, write_workbook):
+    """API on a free port, serving a workbook written from `lines`."""
+    path = write_workbook(tmp_path / 'export.xlsx', lines)
+    service = PricingService(str(path), show_ended=True)
+    srv = make_server(service, '127.0.0.1', 0)
+    thread = threading.Thread(target=srv.serve_forever, daemon=True)
+    thread.start()
+    yield srv
+    srv.shutdown()
+    srv.server_close()
+
+
+def request(srv, method, path, body=None):
+    conn = HTTPConnection(*srv.server_address, timeout=30)
+    try:
+        conn.request(method, path, body=None if body is None else json.dumps(body))
+        resp = conn.getresponse()
+        return resp.status, json.loads(resp.read())
+    finally:
+        conn.close()
+
+
+def test_parse_params_defaults():
+    assert _parse_params(None, None, None) == (15, ['LastMonth', 'Avg3Mo', 'Avg6Mo', 'Avg12Mo'], None)
+
+
+@pytest.mark.parametrize('margin', ['12.5', -1, '2000', 'abc'])
+def test_parse_params_rejects_bad_margin(margin):
+    with pytest.raises(ValueError):
+        _parse_params(margin, None, None)
+
+
+@pytest.mark.parametrize('stats', [['Avg3Mo', 'Median'], 'Avg3Mo', [1], {'Avg3Mo': 1}])
+def test_parse_params_rejects_bad_stats(stats):
+    with pytest.raises(ValueError):
+        _parse_params(10, stats, None)
+
+
+def test_price_key_matches_margin(book):
+    margin, stats, _ = _parse_params('12', ['Avg3Mo'], None)
+    rec = book.by_id['10000001'][0]
+    priced = _price_record(rec, margin, stats)
+    assert priced['prices'] == {'Avg3Mo_With12Pct': pytest.approx(rec['Avg3Mo'] * 1.12)}
+
+
+def test_quote_filters_program_and_drops_credit_notes(book):
+    assert {r['Program'] for r in book.quote('1000002-3', 15, ['Avg3Mo'])} == {'Netvisor', 'Procountor'}
+    assert [r['Program'] for r in book.quote('FI10000023', 15, ['Avg3Mo'], 'Netvisor')] == ['Netvisor']
+    assert book.quote('1000004-5', 15, ['Avg3Mo']) == []
+
+
+def test_quote_ignores_ids_without_digits(lines):
+    # clean_dataframe turns a missing Y-tunnus into 'nan'
+    no_id = lines[lines['Y-tunnus'] == '1000000-1'].assign(**{'Y-tunnus': 'nan'})
+    summary = analytics.compute_company_summary(pd.concat([lines, no_id], ignore_index=True))
+    book = PriceBook(add_flags(summary), 'test', 0.0)
+    assert '' not in book.by_id
+    for company_id in ['abc', '', 'nan', None, {}, [1, 2]]:
+        assert book.quote(company_id, 15, ['Avg3Mo']) == []
+
+
+def test_http_get_price(server):
+    status, body = request(server, 'GET', '/price/1000002-3?margin=20&stat=Avg3Mo&program=Netvisor')
+    assert status == 200
+    [result] = body['results']
+    assert result['Program'] == 'Netvisor'
+    assert list(result['prices']) == ['Avg3Mo_With20Pct']
+
+    assert request(server, 'GET', '/price/9999999-9')[0] == 404
+    assert request(server, 'GET', '/price/1000002-3?margin=2.5')[0] == 400
+    assert request(server, 'GET', '/nope')[0] == 404
+    status, body = request(server, 'GET', '/health')
+    assert status == 200 and body['companies'] > 0
+
+
+def test_http_post_prices(server):
+    status, body = request(server, 'POST', '/prices', {
+        'ids': ['1000002-3', '1000000-1', 'abc', None, {}, '9999999-9'],
+        'stats': ['Avg3Mo'],
+    })
+    assert status == 200
+    assert {r['Y-tunnus'] for r in body['results']} == {'1000002-3', '1000000-1'}
+    assert body['missing'] == ['abc', None, {}, '9999999-9']
+
+    status, body = request(server, 'POST', '/prices', {'ids': ['1000002-3'], 'stats': 'Avg3Mo'})
+    assert status == 400
+    assert 'lista' in body['error']
+    assert request(server, 'POST', '/prices', {'ids': '1000002-3'})[0] == 400
+    assert request(server, 'POST', '/nope', {})[0] == 404
+
+
+def test_http_concurrent_requests(server):
+    ids = ['1000000-1', '1000002-3', '1000003-4', '9999999-9'] * 10
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        statuses = list(pool.map(lambda cid: request(server, 'GET', f'/price/{cid}')[0], ids))
+    assert statuses == [404 if cid == '9999999-9' else 200 for cid in ids]
+
+
+def test_reload_swaps_book(server, lines, write_workbook):
+    service = server.service
+    assert not service.reload_if_changed()
+    old = service.book
+
+    write_workbook(service.path, lines[lines['Y-tunnus'] != '1000000-1'])
+    os.utime(service.path, (old.mtime + 10, old.mtime + 10))
+    assert service.reload_if_changed()
+    assert service.book is not old
+    assert request(server, 'GET', '/price/1000000-1')[0] == 404
+    assert request(server, 'GET', '/price/1000002-3')[0] == 200
@@ -0,0 +1,19 @@
+# tests/test_bench_rerun.py
+
+import os
+import sys
+
+import pytest
+
+pytest.importorskip("streamlit")
+pytest.importorskip("st_aggrid")
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "benchmarks"))
+import bench_rerun  # noqa: E402
+
+
+def test_rerun_latency_budget(tmp_path, monkeypatch):
+    """Drives every interaction of main.py once; breaks when a widget label changes."""
+    monkeypatch.setenv("HINTALASKURI_MATRIX_DIR", str(tmp_path))
+    monkeypatch.chdir(bench_rerun.REPO_ROOT)   # main() chdirs; restored afterwards
+    assert bench_rerun.main(["--sizes", "20", "--repeat", "1", "--budget-scale", "3"]) == 0
@@ -0,0 +1,16 @@
+# tests/test_importtime.py
+
+import os
+import sys
+
+import pytest
+
+pytest.importorskip("streamlit")
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "benchmarks"))
+import importtime_budget  # noqa: E402
+
+
+def test_main_page_import_budget():
+    """No heavy module before an upload, and main.py within its import budget."""
+    assert importtime_budget.main([]) == 0
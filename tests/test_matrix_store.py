@@ -0,0 +1,66 @@
+# tests/test_matrix_store.py
+
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+import analytics
+import matrix_store
+from matrix_store import open_matrix_store, prune_stores, write_matrix_store
+
+
+@pytest.fixture
+def monthly(lines):
+    return analytics.monthly_totals(lines)
+
+
+def test_store_round_trip(monthly, tmp_path):
+    """store.frame has the same shape as main.py's monthly_tbl fallback."""
+    store = open_matrix_store(write_matrix_store(monthly, str(tmp_path / "a")))
+    for cid in ['1000000-1', '1000002-3', '1000003-4']:
+        expected = (
+            monthly[monthly['Y-tunnus'] == cid]
+            .pivot_table(index='Kuukausi', columns='Ohjelmisto', values='MonthlySum', aggfunc='sum')
+        )
+        got = store.frame(cid)
+        np.testing.assert_allclose(got.to_numpy(), expected.to_numpy(), rtol=1e-6)
+        assert list(got.columns) == list(expected.columns)
+        assert got.index.equals(expected.index)
+    assert '9999999-9' not in store
+
+
+def test_prune_keeps_newest(monthly, tmp_path):
+    dirs = []
+    for i in range(4):
+        d = str(tmp_path / f"s{i}")
+        write_matrix_store(monthly, d)
+        os.utime(d, (1000 + i, 1000 + i))
+        dirs.append(d)
+    os.utime(dirs[0])                # reused just now → newest
+    removed = prune_stores(str(tmp_path), keep=2)
+    assert sorted(removed) == sorted(dirs[1:3])
+    assert sorted(os.listdir(tmp_path)) == ['s0', 's3']
+
+
+def test_write_prunes_old_stores(monthly, tmp_path, monkeypatch):
+    monkeypatch.setattr(matrix_store, "STORES_KEPT", 2)
+    for i in range(3):
+        write_matrix_store(monthly, str(tmp_path / f"s{i}"))
+        os.utime(tmp_path / f"s{i}", (1000 + i, 1000 + i))
+    write_matrix_store(monthly, str(tmp_path / "s3"))
+    assert sorted(os.listdir(tmp_path)) == ['s2', 's3']
+
+
+def test_deleted_store_is_not_served_from_cache(monthly, tmp_path):
+    d = str(tmp_path / "a")
+    open_matrix_store(write_matrix_store(monthly, d))
+    shutil.rmtree(d)
+    with pytest.raises(FileNotFoundError):
+        open_matrix_store(d)
+
+    # rewritten with different data → reopened, not the old mapping
+    only_one = monthly[monthly['Y-tunnus'] == '1000002-3']
+    store = open_matrix_store(write_matrix_store(only_one, d))
+    assert store.ids == ['1000002-3']
@@ -0,0 +1,108 @@
+# tests/test_pipeline.py
+
+import os
+import threading
+
+import pytest
+
+import pipeline
+
+
+@pytest.fixture
+def run_job(lines, tmp_path, monkeypatch):
+    """Run a PipelineJob to completion on `lines` instead of a workbook."""
+    monkeypatch.setenv("HINTALASKURI_MATRIX_DIR", str(tmp_path))
+    monkeypatch.setattr(pipeline, "cached_lines", lambda data, use_vat: (len(lines), lines))
+
+    def run(show_ended=True):
+        job = pipeline.PipelineJob(b"test", use_vat=False, show_ended=show_ended).start()
+        job._thread.join(60)
+        assert job.done()
+        return job
+
+    return run
+
+
+def test_job_publishes_every_stage(run_job):
+    job = run_job()
+    assert job.error is None
+    assert job.stage_errors() == {}
+    assert set(job.results()) == set(pipeline.STAGES)
+
+
+def test_optional_stage_error_is_kept_per_stage(run_job, monkeypatch):
+    def broken(*args, **kwargs):
+        raise TypeError("boom")
+
+    monkeypatch.setattr(pipeline, "cost_change_alerts", broken)
+    job = run_job()
+    assert job.error is None
+    assert "alerts" not in job.results()
+    assert "flags" in job.results()
+    assert isinstance(job.stage_errors()["alerts"], TypeError)
+
+
+def test_required_stage_error_fails_the_job(run_job, monkeypatch):
+    def broken(*args, **kwargs):
+        raise ValueError("boom")
+
+    monkeypatch.setattr(pipeline, "add_flags", broken)
+    job = run_job()
+    assert isinstance(job.error, ValueError)
+    assert "flags" not in job.results()
+
+
+def test_matrix_store_failure_is_optional(run_job, monkeypatch):
+    def read_only(*args, **kwargs):
+        raise PermissionError("read-only file system")
+
+    monkeypatch.setattr(pipeline, "write_matrix_store", read_only)
+    job = run_job()
+    assert job.error is None
+    assert "matrix" not in job.results()
+    assert "alerts" in job.results()
+    assert isinstance(job.stage_errors()["matrix"], PermissionError)
+
+
+def test_ensure_job_reuses_job_for_same_key(run_job):
+    state = {}
+    job = pipeline.ensure_job(state, b"test", use_vat=False, show_ended=True)
+    assert pipeline.ensure_job(state, b"test", use_vat=False, show_ended=True) is job
+    assert state["pipeline_job"] is job
+    assert not job.cancelled
+    job._thread.join(60)
+
+
+def test_ensure_job_cancels_stale_job(lines, tmp_path, monkeypatch):
+    monkeypatch.setenv("HINTALASKURI_MATRIX_DIR", str(tmp_path))
+    release = threading.Event()
+
+    def slow_lines(data, use_vat):
+        if data == b"old":
+            release.wait(60)
+        return len(lines), lines
+
+    monkeypatch.setattr(pipeline, "cached_lines", slow_lines)
+    state = {}
+    old = pipeline.ensure_job(state, b"old", use_vat=False, show_ended=True)
+    new = pipeline.ensure_job(state, b"new", use_vat=False, show_ended=True)
+    assert new is not old
+    assert state["pipeline_job"] is new
+    assert old.cancelled and not new.cancelled
+
+    release.set()
+    old._thread.join(60)
+    new._thread.join(60)
+    assert old.results() == {} and old.stage_errors() == {}
+    assert old.error is None
+    assert set(new.results()) == set(pipeline.STAGES)
+    assert os.listdir(tmp_path) == [new.key]
+
+
+def test_cancelled_job_skips_optional_stages():
+    job = pipeline.PipelineJob(b"test", use_vat=False, show_ended=True)
+    job.cancel()
+    calls = []
+    with pytest.raises(pipeline.JobCancelled):
+        job._publish_optional("matrix", lambda: calls.append("matrix"))
+    assert calls == []